@@ -7,15 +7,25 @@
 # - Os filtros são definidos dinamicamente com base nas colunas detectadas
 # --------------------------------------
 
-from io import BytesIO
-import pandas as pd
+import time
+
+# Marca o início da execução do script para medir o tempo de inicialização
+inicio_script = time.perf_counter()
+
+import logging
 import streamlit as st
 from sqlalchemy import create_engine, text
 from dotenv import load_dotenv
 from sqlalchemy.engine.url import URL
 import os
+import uuid
 from components.streamlit_ace import st_ace
 import json
+from consultas.admissao import ConsultaRecusada, ControleAdmissao
+from consultas.roteamento import criar_roteador_protheus
+
+# pandas/pyarrow (consultas.dataframe, consultas.diff) e openpyxl (consultas.exportacao)
+# são importados só quando uma consulta é executada ou exportada
 
 # Carrega variáveis de ambiente do .env
 load_dotenv()
@@ -27,279 +37,91 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-# Estilo customizado profissional com destaque para filtros
-st.markdown("""
-    <style>
-    .main .block-container {
-        padding-top: 1rem;
-        padding-left: 1rem;
-        padding-right: 1rem;
-        padding-bottom: 1rem;
-        max-width: 100%;
-    }
-
-    /* Estilo profissional para o fundo */
-    .stApp {
-        background: linear-gradient(135deg, #1e1e1e 0%, #2d2d2d 100%);
-    }
-
-    /* Melhor espaçamento para os elementos */
-    .stSelectbox > div > div {
-        background-color: #262730;
-        border: 1px solid #444;
-        border-radius: 6px;
-    }
-
-    /* DESTAQUE ESPECIAL PARA FILTROS */
-    .filtros-container {
-        background: linear-gradient(135deg, #1a4b8c 0%, #2563eb 100%);
-        border: 2px solid #3b82f6;
-        border-radius: 12px;
-        padding: 1.5rem;
-        margin: 1rem 0;
-        box-shadow: 0 8px 25px rgba(59, 130, 246, 0.3);
-        position: relative;
-        overflow: hidden;
-    }
-
-    .filtros-container::before {
-        content: '';
-        position: absolute;
-        top: 0;
-        left: 0;
-        right: 0;
-        height: 4px;
-        background: linear-gradient(90deg, #60a5fa, #3b82f6, #1d4ed8);
-        animation: shimmer 2s infinite;
-    }
-
-    @keyframes shimmer {
-        0% { transform: translateX(-100%); }
-        100% { transform: translateX(100%); }
-    }
-
-    .filtros-title {
-        color: #ffffff !important;
-        font-weight: bold;
-        font-size: 1.2rem;
-        margin-bottom: 1rem;
-        text-shadow: 0 2px 4px rgba(0,0,0,0.3);
-    }
-
-    /* Destaque para a área de resultado */
-    .resultado-container {
-        background: linear-gradient(135deg, #1e1e1e 0%, #2a2a2a 100%);
-        border: 1px solid #444;
-        border-radius: 12px;
-        padding: 1.5rem;
-        margin-top: 0.5rem;
-        box-shadow: 0 4px 20px rgba(0,0,0,0.3);
-    }
-
-    /* Melhor visibilidade dos botões */
-    .stButton > button {
-        width: 100%;
-        margin-bottom: 0.5rem;
-        border-radius: 8px;
-        font-weight: 600;
-        transition: all 0.3s ease;
-        border: 1px solid #444;
-    }
-
-    .stButton > button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 4px 12px rgba(0,0,0,0.3);
-    }
-
-    /* Botão primário especial */
-    .stButton > button[kind="primary"] {
-        background: linear-gradient(135deg, #3b82f6 0%, #1d4ed8 100%);
-        border: none;
-        color: white;
-    }
-
-    /* Espaçamento dos campos de entrada */
-    .stTextInput > div > div > input,
-    .stTextArea > div > div > textarea {
-        background-color: #262730;
-        border: 1px solid #444;
-        border-radius: 6px;
-        transition: border-color 0.3s ease;
-    }
-
-    .stTextInput > div > div > input:focus,
-    .stTextArea > div > div > textarea:focus {
-        border-color: #3b82f6;
-        box-shadow: 0 0 0 2px rgba(59, 130, 246, 0.2);
-    }
-
-    /* Título principal */
-    h1 {
-        text-align: center;
-        margin-bottom: 2rem;
-        color: #ffffff;
-        text-shadow: 0 2px 4px rgba(0,0,0,0.3);
-        font-size: 2.5rem;
-        background: linear-gradient(135deg, #60a5fa, #3b82f6);
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-        background-clip: text;
-    }
-
-    /* Subtítulos das seções */
-    h3 {
-        border-bottom: 2px solid #3b82f6;
-        padding-bottom: 0.5rem;
-        margin-bottom: 1rem;
-        color: #ffffff;
-        font-weight: 600;
-    }
-
-    /* Cards profissionais */
-    .section-card {
-        background: linear-gradient(135deg, #1e1e1e 0%, #2a2a2a 100%);
-        border: 1px solid #444;
-        border-radius: 12px;
-        padding: 1.5rem;
-        margin-bottom: 1rem;
-        box-shadow: 0 4px 20px rgba(0,0,0,0.2);
-    }
-
-    /* Métricas destacadas */
-    .metric-card {
-        background: linear-gradient(135deg, #374151 0%, #4b5563 100%);
-        border-radius: 8px;
-        padding: 1rem;
-        text-align: center;
-        border: 1px solid #6b7280;
-    }
-
-    /* Melhor aparência para multiselect */
-    .stMultiSelect > div > div {
-        background-color: #262730;
-        border: 2px solid #3b82f6;
-        border-radius: 8px;
-    }
-
-    /* Destaque para campos de data nos filtros */
-    .filtros-container .stDateInput > div > div > input {
-        background-color: rgba(255,255,255,0.1);
-        border: 1px solid rgba(255,255,255,0.3);
-        color: white;
-    }
-
-    .filtros-container .stTextInput > div > div > input {
-        background-color: rgba(255,255,255,0.1);
-        border: 1px solid rgba(255,255,255,0.3);
-        color: white;
-    }
-
-    .filtros-container .stMultiSelect > div > div {
-        background-color: rgba(255,255,255,0.1);
-        border: 1px solid rgba(255,255,255,0.3);
-    }
-
-    /* Animação suave para elementos interativos */
-    .stSelectbox, .stTextInput, .stTextArea, .stMultiSelect {
-        transition: all 0.3s ease;
-    }
-
-    /* Divider personalizado */
-    hr {
-        border: none;
-        height: 2px;
-        background: linear-gradient(90deg, transparent, #3b82f6, transparent);
-        margin: 2rem 0;
-    }
-
-    /* Customização do editor ACE - mudando a faixa roxa para azul */
-    .ace_gutter {
-        background: linear-gradient(135deg, #1e40af 0%, #3b82f6 100%) !important;
-        border-right: 2px solid #60a5fa !important;
-    }
-
-    .ace_gutter-active-line {
-        background-color: rgba(96, 165, 250, 0.3) !important;
-    }
-
-    .ace_gutter-cell {
-        color: #e5e7eb !important;
-        background: transparent !important;
-    }
-
-    .ace_gutter-cell.ace_info {
-        background: rgba(59, 130, 246, 0.2) !important;
-    }
-
-    /* Linha ativa no editor */
-    .ace_active-line {
-        background: rgba(59, 130, 246, 0.1) !important;
-    }
-
-    /* Cursor do editor */
-    .ace_cursor {
-        color: #60a5fa !important;
-    }
-
-    /* Seleção no editor */
-    .ace_selection {
-        background: rgba(59, 130, 246, 0.3) !important;
-    }
-
-    /* Força a customização do gutter mesmo com tema chrome */
-    div[data-testid="stAce"] .ace_gutter {
-        background: linear-gradient(135deg, #1e40af 0%, #3b82f6 100%) !important;
-        border-right: 2px solid #60a5fa !important;
-    }
-
-    /* Customização adicional para garantir que o azul apareça */
-    .ace_editor .ace_gutter {
-        background: linear-gradient(135deg, #1e40af 0%, #3b82f6 100%) !important;
-        border-right: 2px solid #60a5fa !important;
-    }
-
-    /* Sobrescreve qualquer cor de fundo do tema */
-    .ace_gutter-layer {
-        background: linear-gradient(135deg, #1e40af 0%, #3b82f6 100%) !important;
-    }
-    </style>
-""", unsafe_allow_html=True)
+# Orçamento de tempo para a primeira renderização de uma sessão (ms)
+ORCAMENTO_INICIALIZACAO_MS = int(os.getenv("orcamento_inicializacao_ms", 1500))
+
+# Tempo em cache da lista de consultas salvas e das colunas detectadas (s)
+TTL_CONSULTAS_SALVAS = 60
+TTL_COLUNAS = 300
+
+
+# Estilo customizado profissional com destaque para filtros (lido uma vez por processo)
+@st.cache_resource
+def carregar_estilo():
+    with open("assets/estilo.css", "r", encoding="utf-8") as f:
+        return f"<style>\n{f.read()}</style>"
+
+
+st.markdown(carregar_estilo(), unsafe_allow_html=True)
 
 # -------------------------
 # Conexões com os bancos
 # -------------------------
 
+# As engines (e seus pools de conexão) são criadas uma vez por processo,
+# e não a cada execução do script
+@st.cache_resource
+def obter_engines():
+    return criar_engine_postgres(), criar_roteador_protheus()
+
+
 # Conexão com banco PostgreSQL (armazenamento de consultas)
-engine_postgres = create_engine(
-    URL.create(
-        drivername="postgresql+psycopg2",
-        username=os.getenv("username_postgres"),
-        password=os.getenv("password_postgres"),
-        host=os.getenv("host_postgres"),
-        port=os.getenv("port_postgres"),
-        database=os.getenv("database_postgres"),
-        query={"sslmode": "disable"}
+def criar_engine_postgres():
+    return create_engine(
+        URL.create(
+            drivername="postgresql+psycopg2",
+            username=os.getenv("username_postgres"),
+            password=os.getenv("password_postgres"),
+            host=os.getenv("host_postgres"),
+            port=os.getenv("port_postgres"),
+            database=os.getenv("database_postgres"),
+            query={"sslmode": "disable"}
+        )
     )
-)
 
-# Conexão com banco Protheus (execução de consultas)
-engine_protheus = create_engine(
-    URL.create(
-        drivername="postgresql+psycopg2",
-        username=os.getenv("username_protheus"),
-        password=os.getenv("password"),
-        host=os.getenv("host"),
-        port=os.getenv("port"),
-        database=os.getenv("database"),
-        query={"sslmode": "disable"}
+
+# Conexão com banco Protheus (execução de consultas): as leituras vão para as
+# réplicas configuradas em replicas_protheus, com o banco principal como reserva
+engine_postgres, engine_protheus = obter_engines()
+
+
+# Controle de admissão compartilhado por todas as sessões do processo
+@st.cache_resource
+def obter_controle_admissao():
+    return ControleAdmissao(
+        limite_global=int(os.getenv("limite_global_consultas", 4)),
+        limite_usuario=int(os.getenv("limite_usuario_consultas", 1)),
+        tamanho_fila=int(os.getenv("tamanho_fila_consultas", 20))
     )
-)
+
+
+controle_admissao = obter_controle_admissao()
+
+
+
+# Usuário para os limites de concorrência: o app não tem login, então usa o cabeçalho
+# de usuário do proxy (cabecalho_usuario, ex.: X-Forwarded-User), que vale para todas
+# as abas; sem ele, cada sessão conta como um usuário. O IP do cliente só é usado com
+# identificar_por_ip=1, pois atrás de NAT o escritório inteiro dividiria uma vaga
+def identificar_usuario():
+    cabecalho = os.getenv("cabecalho_usuario")
+    if cabecalho and st.context.headers.get(cabecalho):
+        return f"usuario:{st.context.headers[cabecalho]}"
+    if os.getenv("identificar_por_ip") == "1" and st.context.ip_address:
+        return f"ip:{st.context.ip_address}"
+    if "sessao" not in st.session_state:
+        st.session_state["sessao"] = uuid.uuid4().hex
+    return f"sessao:{st.session_state['sessao']}"
 
 
 # -------------------------
 # Utilitários
 # -------------------------
 
+# Quantidade de execuções anteriores mantidas na sessão para comparação
+MAX_EXECUCOES_GUARDADAS = 5
+
+
 # Verifica se a consulta contém comandos proibidos
 def validar_sql_base(sql):
     proibidos = ["delete", "drop", "update", "insert"]
@@ -313,12 +135,13 @@ def validar_sql_base(sql):
 # Funções CRUD
 # -------------------------
 
-# Lista de Consultas
+# Lista de Consultas (em cache; limpa ao salvar ou deletar)
+@st.cache_data(ttl=TTL_CONSULTAS_SALVAS, show_spinner=False)
 def listar_consultas():
     with engine_postgres.connect() as conn:
         result = conn.execute(
             text("SELECT id, nome, descricao, criado_em FROM consultas_salvas ORDER BY criado_em DESC"))
-        return pd.DataFrame(result.fetchall(), columns=result.keys())
+        return [dict(linha) for linha in result.mappings()]
 
 
 # Salvamento de Consultas
@@ -327,6 +150,7 @@ def salvar_consulta(nome, descricao, consulta_sql):
         conn.execute(text("""
             INSERT INTO consultas_salvas (nome, descricao, consulta) VALUES (:nome, :descricao, :consulta)
         """), {"nome": nome, "descricao": descricao, "consulta": consulta_sql})
+    listar_consultas.clear()
 
 
 # Carrega a consulta da lista para o campo 'Consulta SQL'
@@ -340,55 +164,78 @@ def carregar_consulta(id):
 def deletar_consulta(id):
     with engine_postgres.begin() as conn:
         conn.execute(text("DELETE FROM consultas_salvas WHERE id = :id"), {"id": id})
+    listar_consultas.clear()
+
+
+# Colunas retornadas pela consulta, usadas nos filtros (em cache por consulta)
+@st.cache_data(ttl=TTL_COLUNAS, show_spinner=False)
+def obter_colunas(consulta_sql):
+    with engine_protheus.connect() as conn:
+        result = conn.execute(text(f"SELECT * FROM ({consulta_sql}) AS base LIMIT 0"))
+        return list(result.keys())
+
+
+# Palavras do autocomplete, lidas uma vez por processo
+@st.cache_resource
+def carregar_autocomplete():
+    try:
+        with open("autocomplete/autocomplete_cache.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
 
 
 # -------------------------
 # Interface Streamlit
 # -------------------------
 
-st.title("Gerenciador de Consultas SQL")
+# Seção de gerenciamento de consultas salvas
+def mostrar_consultas_salvas():
+    st.markdown('<div class="section-card">', unsafe_allow_html=True)
+    st.markdown("### 📋 Consultas Salvas")
+    consultas = listar_consultas()
+    nomes_consultas = {consulta["id"]: consulta["nome"] for consulta in consultas}
+
+    # Layout em colunas para a seção de consultas salvas
+    col_select, col_actions = st.columns([3, 1])
+
+    with col_select:
+        id_selecionado = st.selectbox(
+            "Selecione uma consulta:",
+            options=list(nomes_consultas),
+            format_func=lambda x: nomes_consultas.get(x, "Nenhuma consulta disponível")
+        )
 
-# Seção de gerenciamento de consultas salvas (topo da página)
-st.markdown('<div class="section-card">', unsafe_allow_html=True)
-st.markdown("### 📋 Consultas Salvas")
-consultas = listar_consultas()
+    with col_actions:
+        col_carregar, col_deletar = st.columns(2)
 
-# Layout em colunas para a seção de consultas salvas
-col_select, col_actions = st.columns([3, 1])
+        with col_carregar:
+            if st.button("🔄 Carregar", use_container_width=True) and id_selecionado:
+                st.session_state["consulta"] = carregar_consulta(id_selecionado)
+                st.rerun()
 
-with col_select:
-    id_selecionado = st.selectbox(
-        "Selecione uma consulta:",
-        options=consultas["id"] if not consultas.empty else [],
-        format_func=lambda x: consultas[consultas["id"] == x]["nome"].values[
-            0] if not consultas.empty else "Nenhuma consulta disponível"
-    )
+        with col_deletar:
+            if st.button("🗑️ Deletar", use_container_width=True) and id_selecionado:
+                deletar_consulta(id_selecionado)
+                st.success("Consulta deletada.")
+                st.rerun()
+    st.markdown('</div>', unsafe_allow_html=True)
 
-with col_actions:
-    col_carregar, col_deletar = st.columns(2)
 
-    if "consulta" not in st.session_state:
-        st.session_state["consulta"] = ""
+st.title("Gerenciador de Consultas SQL")
 
-    with col_carregar:
-        if st.button("🔄 Carregar", use_container_width=True) and id_selecionado:
-            st.session_state["consulta"] = carregar_consulta(id_selecionado)
-            st.rerun()
+# Seção de gerenciamento de consultas salvas (topo da página). É preenchida no fim
+# do script, para que a leitura do PostgreSQL não atrase o editor e os resultados
+area_consultas_salvas = st.container()
 
-    with col_deletar:
-        if st.button("🗑️ Deletar", use_container_width=True) and id_selecionado:
-            deletar_consulta(id_selecionado)
-            st.success("Consulta deletada.")
-            st.rerun()
+if "consulta" not in st.session_state:
+    st.session_state["consulta"] = ""
 
-st.markdown('</div>', unsafe_allow_html=True)
 st.divider()
 
 # Carrega as palavras do autocomplete
-try:
-    with open("autocomplete/autocomplete_cache.json", "r", encoding="utf-8") as f:
-        autocomplete_formatado = json.load(f)
-except FileNotFoundError:
+autocomplete_formatado = carregar_autocomplete()
+if autocomplete_formatado is None:
     autocomplete_formatado = []
     st.warning("Arquivo 'autocomplete_cache.json' não encontrado. Autocomplete desabilitado.")
 
@@ -433,6 +280,102 @@ with col_esquerda:
             st.rerun()
     st.markdown('</div>', unsafe_allow_html=True)
 
+# ---------------------
+# COLUNA DIREITA - Resultado
+# (antes dos filtros, para não esperar a leitura das colunas no Protheus)
+# ---------------------
+with col_direita:
+    st.markdown('<div class="resultado-container">', unsafe_allow_html=True)
+    st.markdown("### 📊 Resultado da Consulta")
+
+    if "df_result" in st.session_state and not st.session_state["df_result"].empty:
+        df_result = st.session_state["df_result"]
+
+        # Informações sobre o resultado em cards
+        col_info1, col_info2, col_info3 = st.columns(3)
+        with col_info1:
+            st.markdown('<div class="metric-card">', unsafe_allow_html=True)
+            st.metric("📊 Registros", len(df_result))
+            st.markdown('</div>', unsafe_allow_html=True)
+        with col_info2:
+            st.markdown('<div class="metric-card">', unsafe_allow_html=True)
+            st.metric("📋 Colunas", len(df_result.columns))
+            st.markdown('</div>', unsafe_allow_html=True)
+        with col_info3:
+            st.markdown('<div class="metric-card">', unsafe_allow_html=True)
+            st.metric("💾 Tamanho", f"{df_result.memory_usage(deep=True).sum() / 1024:.1f} KB")
+            st.markdown('</div>', unsafe_allow_html=True)
+
+        # Diferenças em relação à execução anterior da mesma consulta
+        if "diff_result" in st.session_state:
+            diff_result = st.session_state["diff_result"]
+            col_inc, col_rem, col_alt = st.columns(3)
+            with col_inc:
+                st.metric("➕ Incluídos", len(diff_result["incluidos"]))
+            with col_rem:
+                st.metric("➖ Removidos", len(diff_result["removidos"]))
+            with col_alt:
+                st.metric("✏️ Alterados", len(diff_result["alterados"]))
+
+            for titulo, chave_diff in [("➕ Incluídos", "incluidos"), ("➖ Removidos", "removidos"),
+                                       ("✏️ Alterados", "alterados")]:
+                if not diff_result[chave_diff].empty:
+                    with st.expander(titulo):
+                        st.dataframe(diff_result[chave_diff], use_container_width=True)
+
+        # Tabela de resultados com altura fixa para melhor visualização
+        st.dataframe(
+            df_result,
+            use_container_width=True,
+            height=500
+        )
+
+        # Botões de download
+        from consultas.exportacao import gerar_csv, gerar_excel
+
+        # Arquivos gerados uma vez por resultado, e não a cada execução do script
+        exportacao = st.session_state.get("exportacao")
+        if exportacao is None or exportacao["resultado"] is not df_result:
+            exportacao = {"resultado": df_result, "excel": gerar_excel(df_result).getvalue(),
+                          "csv": gerar_csv(df_result)}
+            st.session_state["exportacao"] = exportacao
+
+        st.markdown("### 📥 Downloads")
+        col_excel, col_csv = st.columns(2)
+
+        with col_excel:
+            st.download_button(
+                "📊 Baixar Excel",
+                data=exportacao["excel"],
+                file_name="resultado.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                use_container_width=True
+            )
+
+        with col_csv:
+            st.download_button(
+                "📄 Baixar CSV",
+                data=exportacao["csv"],
+                file_name="resultado.csv",
+                mime="text/csv",
+                use_container_width=True
+            )
+    else:
+        # Placeholder quando não há resultado
+        st.info("Execute uma consulta para ver os resultados aqui.")
+        st.markdown("""
+        <div style="text-align: center; padding: 3rem; color: #666;">
+            <h4>🔍 Aguardando execução da consulta</h4>
+            <p>Os resultados aparecerão nesta área após a execução.</p>
+        </div>
+        """, unsafe_allow_html=True)
+
+    st.markdown('</div>', unsafe_allow_html=True)
+
+# ---------------------
+# COLUNA ESQUERDA - Filtros e Execução
+# ---------------------
+with col_esquerda:
     # Seção de filtros COM DESTAQUE ESPECIAL
     st.markdown('<div class="filtros-container">', unsafe_allow_html=True)
     st.markdown('<h3 class="filtros-title">🔍 FILTROS DINÂMICOS</h3>', unsafe_allow_html=True)
@@ -442,9 +385,7 @@ with col_esquerda:
 
     if consulta_sql.strip():
         try:
-            with engine_protheus.connect() as conn:
-                df_top1 = pd.read_sql(f"SELECT * FROM ({consulta_sql}) AS base LIMIT 1", conn)
-            colunas_disponiveis = df_top1.columns.tolist()
+            colunas_disponiveis = obter_colunas(consulta_sql)
 
             if colunas_disponiveis:
                 st.markdown("**🎯 Selecione as colunas para filtrar:**")
@@ -482,7 +423,44 @@ with col_esquerda:
     # Botão de execução
     st.markdown('<div class="section-card">', unsafe_allow_html=True)
     st.markdown("### ▶️ Executar")
-    if st.button("🚀 Executar Consulta", use_container_width=True, type="primary"):
+    if "mensagem_execucao" in st.session_state:
+        st.success(st.session_state.pop("mensagem_execucao"))
+
+    # Comparação com a execução anterior e atualização incremental
+    with st.expander("🔁 Comparar com execução anterior"):
+        coluna_chave = st.selectbox(
+            "Coluna chave:",
+            [""] + colunas_disponiveis,
+            help="Usada para identificar linhas incluídas, removidas e alteradas",
+            key="coluna_chave_diff"
+        )
+        coluna_marca = st.selectbox(
+            "Coluna marca d'água:",
+            [""] + colunas_disponiveis,
+            help="Data ou R_E_C_N_O_: a atualização incremental busca só valores a partir do último carregado",
+            key="coluna_marca_dagua"
+        )
+
+    executar = st.button("🚀 Executar Consulta", use_container_width=True, type="primary")
+    incremental = st.button("🔁 Atualização Incremental", use_container_width=True, disabled=not coluna_marca)
+
+    situacao_admissao = controle_admissao.situacao()
+    st.caption(
+        f"🚦 {situacao_admissao['rodando']}/{controle_admissao.limite_global} consultas em execução, "
+        f"{situacao_admissao['aguardando']} na fila"
+    )
+
+    # Situação das réplicas de leitura, quando configuradas
+    for replica in engine_protheus.situacao():
+        if not replica["disponivel"]:
+            estado = "🔴 indisponível"
+        elif replica["atraso"] > engine_protheus.atraso_maximo:
+            estado = f"🟡 atraso de {replica['atraso']:.0f} s acima do limite"
+        else:
+            estado = f"🟢 atraso de {replica['atraso']:.0f} s, {replica['em_andamento']} em andamento"
+        st.caption(f"Réplica {replica['host']}: {estado}")
+
+    if executar or incremental:
         if not consulta_sql.strip():
             st.error("Digite uma consulta SQL.")
         elif not validar_sql_base(consulta_sql):
@@ -507,81 +485,76 @@ with col_esquerda:
             if where:
                 sql_final += f" AND {where}"
 
+            from consultas.dataframe import ler_dataframe
+            from consultas.diff import atualizar_incremental, calcular_diff, chave_execucao
+
+            execucoes = st.session_state.setdefault("execucoes", {})
+            chave = chave_execucao(sql_final, params)
+            df_anterior = execucoes.get(chave)
+
+            def executar_consulta():
+                with engine_protheus.connect() as conn:
+                    if incremental and df_anterior is not None:
+                        return atualizar_incremental(
+                            conn, sql_final, params, df_anterior, coluna_marca, coluna_chave or None
+                        )
+                    return ler_dataframe(conn, sql_final, params)
+
+            # Execuções idênticas em andamento são compartilhadas; a incremental depende do resultado da sessão
+            chave_admissao = f"{chave}:{id(df_anterior)}" if incremental else chave
+            aviso_fila = st.empty()
+
             try:
                 with st.spinner("Executando consulta..."):
-                    with engine_protheus.connect() as conn:
-                        df_result = pd.read_sql(text(sql_final), conn, params=params)
+                    df_result = controle_admissao.executar(
+                        identificar_usuario(),
+                        chave_admissao,
+                        executar_consulta,
+                        ao_aguardar=lambda posicao: aviso_fila.info(f"⏳ Aguardando na fila: posição {posicao}")
+                    )
+                    aviso_fila.empty()
                     st.session_state["df_result"] = df_result
-                    st.success(f"Consulta executada! {len(df_result)} registros encontrados.")
+
+                    if df_anterior is not None and coluna_chave:
+                        st.session_state["diff_result"] = calcular_diff(df_anterior, df_result, coluna_chave)
+                    else:
+                        st.session_state.pop("diff_result", None)
+
+                    execucoes.pop(chave, None)
+                    execucoes[chave] = df_result
+                    while len(execucoes) > MAX_EXECUCOES_GUARDADAS:
+                        execucoes.pop(next(iter(execucoes)))
+                    st.session_state["mensagem_execucao"] = (
+                        f"Consulta executada! {len(df_result)} registros encontrados."
+                    )
+            except ConsultaRecusada as e:
+                aviso_fila.empty()
+                st.warning(f"{e} Tente novamente em instantes.")
             except Exception as e:
+                aviso_fila.empty()
                 st.error(f"Erro na execução: {e}")
-    st.markdown('</div>', unsafe_allow_html=True)
-
-# ---------------------
-# COLUNA DIREITA - Resultado
-# ---------------------
-with col_direita:
-    st.markdown('<div class="resultado-container">', unsafe_allow_html=True)
-    st.markdown("### 📊 Resultado da Consulta")
-
-    if "df_result" in st.session_state and not st.session_state["df_result"].empty:
-        df_result = st.session_state["df_result"]
 
-        # Informações sobre o resultado em cards
-        col_info1, col_info2, col_info3 = st.columns(3)
-        with col_info1:
-            st.markdown('<div class="metric-card">', unsafe_allow_html=True)
-            st.metric("📊 Registros", len(df_result))
-            st.markdown('</div>', unsafe_allow_html=True)
-        with col_info2:
-            st.markdown('<div class="metric-card">', unsafe_allow_html=True)
-            st.metric("📋 Colunas", len(df_result.columns))
-            st.markdown('</div>', unsafe_allow_html=True)
-        with col_info3:
-            st.markdown('<div class="metric-card">', unsafe_allow_html=True)
-            st.metric("💾 Tamanho", f"{df_result.memory_usage(deep=True).sum() / 1024:.1f} KB")
-            st.markdown('</div>', unsafe_allow_html=True)
+            # O resultado já foi desenhado nesta execução do script; redesenha com o novo
+            if "mensagem_execucao" in st.session_state:
+                st.rerun()
+    st.markdown('</div>', unsafe_allow_html=True)
 
-        # Tabela de resultados com altura fixa para melhor visualização
-        st.dataframe(
-            df_result,
-            use_container_width=True,
-            height=500
+# Consultas salvas por último: a página já está desenhada enquanto o PostgreSQL responde
+with area_consultas_salvas:
+    mostrar_consultas_salvas()
+
+# Tempo até o fim da primeira renderização da sessão, exibido no rodapé e
+# registrado no log quando passa do orçamento
+if "tempo_inicializacao_ms" not in st.session_state:
+    tempo_inicializacao_ms = (time.perf_counter() - inicio_script) * 1000
+    st.session_state["tempo_inicializacao_ms"] = tempo_inicializacao_ms
+    if tempo_inicializacao_ms > ORCAMENTO_INICIALIZACAO_MS:
+        logging.warning(
+            "Inicialização levou %.0f ms (orçamento de %d ms)", tempo_inicializacao_ms, ORCAMENTO_INICIALIZACAO_MS
         )
 
-        # Botões de download
-        st.markdown("### 📥 Downloads")
-        col_excel, col_csv = st.columns(2)
-
-        with col_excel:
-            excel_stream = BytesIO()
-            df_result.to_excel(excel_stream, index=False, engine="openpyxl")
-            excel_stream.seek(0)
-            st.download_button(
-                "📊 Baixar Excel",
-                data=excel_stream,
-                file_name="resultado.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                use_container_width=True
-            )
-
-        with col_csv:
-            csv_data = df_result.to_csv(index=False).encode("utf-8")
-            st.download_button(
-                "📄 Baixar CSV",
-                data=csv_data,
-                file_name="resultado.csv",
-                mime="text/csv",
-                use_container_width=True
-            )
-    else:
-        # Placeholder quando não há resultado
-        st.info("Execute uma consulta para ver os resultados aqui.")
-        st.markdown("""
-        <div style="text-align: center; padding: 3rem; color: #666;">
-            <h4>🔍 Aguardando execução da consulta</h4>
-            <p>Os resultados aparecerão nesta área após a execução.</p>
-        </div>
-        """, unsafe_allow_html=True)
-
-    st.markdown('</div>', unsafe_allow_html=True)
\ No newline at end of file
+tempo_inicializacao_ms = st.session_state["tempo_inicializacao_ms"]
+st.caption(
+    f"{'⏱️' if tempo_inicializacao_ms <= ORCAMENTO_INICIALIZACAO_MS else '⚠️'} "
+    f"Primeira renderização: {tempo_inicializacao_ms:.0f} ms (orçamento de {ORCAMENTO_INICIALIZACAO_MS} ms)"
+)
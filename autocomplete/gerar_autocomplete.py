@@ -1,23 +1,19 @@
-from sqlalchemy import create_engine, text
-from sqlalchemy.engine.url import URL
+from sqlalchemy import text
 from dotenv import load_dotenv
 import os
+import sys
 import json
 
 load_dotenv()
 
-def gerar_autocomplete():
-    engine = create_engine(
-        URL.create(
-            drivername="postgresql+psycopg2",
-            username=os.getenv("username_protheus"),
-            password=os.getenv("password"),
-            host=os.getenv("host"),
-            port=os.getenv("port"),
-            database=os.getenv("database"),
-            query={"sslmode": "disable"}
-        )
-    )
+# Permite rodar o script de dentro da pasta autocomplete
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from consultas.roteamento import criar_roteador_protheus
+
+def gerar_autocomplete(engine=None):
+    # A varredura do schema vai para uma réplica, quando houver
+    engine = engine or criar_roteador_protheus()
 
     query = """
         SELECT table_name, column_name 
@@ -0,0 +1,268 @@
+# --------------------------------------
+# Benchmark do caminho de execução de consultas
+# --------------------------------------
+# - Popula um PostgreSQL local (ou SQLite temporário) com tabelas no
+#   formato do Protheus, com quantidade de linhas configurável
+# - Mede leitura das colunas, execução, montagem do DataFrame,
+#   exportação CSV/XLSX e geração do autocomplete
+# - Simula N sessões executando a mesma consulta ao mesmo tempo
+# - Cada medição é gravada como uma linha JSON, para comparar execuções
+#
+# Uso (na raiz do projeto):
+#   python -m benchmark.benchmark --linhas 10000 100000 1000000 --sessoes 8 --saida resultados.jsonl
+#
+# Sem as variáveis *_bench no .env, usa um SQLite temporário.
+# --------------------------------------
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+from dotenv import load_dotenv
+from sqlalchemy import Column, Integer, MetaData, Numeric, String, Table, create_engine, text
+from sqlalchemy.engine.url import URL
+
+from autocomplete.gerar_autocomplete import gerar_autocomplete
+from consultas.dataframe import ler_dataframe
+from consultas.exportacao import gerar_csv, gerar_excel
+
+load_dotenv()
+
+# Tamanho dos lotes de INSERT ao popular a tabela
+LOTE_CARGA = 5_000
+
+# Limite de linhas de uma planilha do Excel
+MAX_LINHAS_XLSX = 1_048_575
+
+metadata = MetaData()
+
+# Cabeçalho de notas fiscais de saída no formato do Protheus (SF2), com os nomes
+# em minúsculas como o DBAccess cria no PostgreSQL (em maiúsculas o SQLAlchemy
+# colocaria aspas e a CONSULTA, sem aspas, não encontraria as colunas)
+tabela_sf2 = Table(
+    "sf2010_bench", metadata,
+    Column("f2_filial", String(2)),
+    Column("f2_doc", String(9)),
+    Column("f2_serie", String(3)),
+    Column("f2_cliente", String(6)),
+    Column("f2_loja", String(2)),
+    Column("f2_emissao", String(8)),
+    Column("f2_valbrut", Numeric(14, 2)),
+    Column("f2_valicm", Numeric(14, 2)),
+    Column("f2_tipo", String(1)),
+    Column("f2_obs", String(60)),
+    Column("d_e_l_e_t_", String(1)),
+    Column("r_e_c_n_o_", Integer, primary_key=True),
+)
+
+CONSULTA = """
+    SELECT F2_FILIAL, F2_DOC, F2_SERIE, F2_CLIENTE, F2_LOJA, F2_EMISSAO,
+           F2_VALBRUT, F2_VALICM, F2_TIPO, F2_OBS, R_E_C_N_O_
+    FROM sf2010_bench
+    WHERE D_E_L_E_T_ = ' '
+"""
+
+
+# Conexão com o banco do benchmark
+def criar_engine():
+    if os.getenv("host_bench"):
+        return create_engine(
+            URL.create(
+                drivername="postgresql+psycopg2",
+                username=os.getenv("username_bench"),
+                password=os.getenv("password_bench"),
+                host=os.getenv("host_bench"),
+                port=os.getenv("port_bench"),
+                database=os.getenv("database_bench"),
+                query={"sslmode": "disable"}
+            ),
+            pool_size=32
+        )
+
+    # Arquivo temporário para que cada sessão simulada tenha sua própria conexão
+    caminho = os.path.join(tempfile.mkdtemp(prefix="benchmark_"), "protheus.db")
+    return create_engine(f"sqlite:///{caminho}")
+
+
+# Gera linhas sintéticas com o preenchimento de espaços dos campos CHAR
+def _gerar_linhas(quantidade, semente=42):
+    aleatorio = random.Random(semente)
+    inicio = date(2020, 1, 1)
+    for recno in range(1, quantidade + 1):
+        yield {
+            "f2_filial": aleatorio.choice(["01", "02", "03", "04"]),
+            "f2_doc": f"{recno:09d}",
+            "f2_serie": aleatorio.choice(["1  ", "2  ", "UNI"]),
+            "f2_cliente": f"{aleatorio.randint(1, 5000):06d}",
+            "f2_loja": aleatorio.choice(["01", "02"]),
+            "f2_emissao": (inicio + timedelta(days=aleatorio.randint(0, 1800))).strftime("%Y%m%d"),
+            "f2_valbrut": round(aleatorio.uniform(10, 100_000), 2),
+            "f2_valicm": round(aleatorio.uniform(0, 18_000), 2),
+            "f2_tipo": aleatorio.choice(["N", "N", "N", "D", "B"]),
+            "f2_obs": "".ljust(60) if aleatorio.random() < 0.8 else "OBSERVACAO".ljust(60),
+            "d_e_l_e_t_": "*" if aleatorio.random() < 0.02 else " ",
+            "r_e_c_n_o_": recno,
+        }
+
+
+# Recria a tabela com a quantidade de linhas pedida
+def popular(engine, quantidade):
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    lote = []
+    with engine.begin() as conn:
+        for linha in _gerar_linhas(quantidade):
+            lote.append(linha)
+            if len(lote) == LOTE_CARGA:
+                conn.execute(tabela_sf2.insert(), lote)
+                lote = []
+        if lote:
+            conn.execute(tabela_sf2.insert(), lote)
+
+
+# Executa a função medindo o tempo e, opcionalmente, o pico de memória alocada em Python
+# (o tracemalloc deixa a execução bem mais lenta, por isso fica desligado por padrão)
+def medir(funcao, memoria=False):
+    if memoria:
+        tracemalloc.start()
+    inicio = time.perf_counter()
+    try:
+        retorno = funcao()
+    finally:
+        duracao = time.perf_counter() - inicio
+        metricas = {"segundos": round(duracao, 4)}
+        if memoria:
+            metricas["pico_memoria_bytes"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    return retorno, metricas
+
+
+# Mede cada etapa do caminho de execução para uma quantidade de linhas
+def medir_etapas(engine, linhas, memoria=False):
+    resultados = []
+
+    def registrar(etapa, metricas, **extras):
+        resultados.append({"etapa": etapa, "linhas": linhas, **metricas, **extras})
+
+    def probe():
+        with engine.connect() as conn:
+            return list(conn.execute(text(f"SELECT * FROM ({CONSULTA}) AS base LIMIT 0")).keys())
+
+    _, metricas = medir(probe, memoria)
+    registrar("colunas", metricas)
+
+    def executar():
+        with engine.connect() as conn:
+            return ler_dataframe(conn, CONSULTA)
+
+    df, metricas = medir(executar, memoria)
+    registrar("execucao", metricas, memoria_dataframe_bytes=int(df.memory_usage(deep=True).sum()))
+
+    # Referência: caminho anterior via pd.read_sql
+    def executar_read_sql():
+        with engine.connect() as conn:
+            return pd.read_sql(text(CONSULTA), conn)
+
+    df_ref, metricas = medir(executar_read_sql, memoria)
+    registrar("execucao_read_sql", metricas, memoria_dataframe_bytes=int(df_ref.memory_usage(deep=True).sum()))
+    del df_ref
+
+    csv_data, metricas = medir(lambda: gerar_csv(df), memoria)
+    registrar("exportacao_csv", metricas, tamanho_arquivo_bytes=len(csv_data))
+
+    if len(df) <= MAX_LINHAS_XLSX:
+        excel_stream, metricas = medir(lambda: gerar_excel(df), memoria)
+        registrar("exportacao_xlsx", metricas, tamanho_arquivo_bytes=excel_stream.getbuffer().nbytes)
+
+    if engine.dialect.name == "postgresql":
+        itens, metricas = medir(lambda: gerar_autocomplete(engine), memoria)
+        registrar("autocomplete", metricas, itens=len(itens))
+
+    return resultados
+
+
+# Simula sessões simultâneas executando a consulta
+def medir_concorrencia(engine, linhas, sessoes, repeticoes):
+    def sessao(_):
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            with engine.connect() as conn:
+                ler_dataframe(conn, CONSULTA)
+            tempos.append(time.perf_counter() - inicio)
+        return tempos
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessoes) as executor:
+        tempos = [t for tempos_sessao in executor.map(sessao, range(sessoes)) for t in tempos_sessao]
+    duracao = time.perf_counter() - inicio
+
+    tempos.sort()
+    return {
+        "etapa": "concorrencia",
+        "linhas": linhas,
+        "sessoes": sessoes,
+        "execucoes": len(tempos),
+        "segundos": round(duracao, 4),
+        "latencia_p50": round(statistics.median(tempos), 4),
+        "latencia_p95": round(tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))], 4),
+        "execucoes_por_segundo": round(len(tempos) / duracao, 2),
+    }
+
+
+# Identifica o commit medido, para comparar execuções ao longo do tempo
+def _commit_atual():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do Gerenciador de Consultas SQL")
+    parser.add_argument("--linhas", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--sessoes", type=int, default=4, help="Sessões simultâneas simuladas")
+    parser.add_argument("--repeticoes", type=int, default=3, help="Execuções por sessão simulada")
+    parser.add_argument("--memoria", action="store_true", help="Mede também o pico de memória de cada etapa")
+    parser.add_argument("--saida", help="Arquivo JSONL onde os resultados são acrescentados")
+    args = parser.parse_args()
+
+    engine = criar_engine()
+    execucao = {
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "commit": _commit_atual(),
+        "banco": engine.dialect.name,
+    }
+
+    saida = open(args.saida, "a", encoding="utf-8") if args.saida else sys.stdout
+    try:
+        for linhas in args.linhas:
+            _, metricas = medir(lambda: popular(engine, linhas))
+            resultados = [{"etapa": "carga", "linhas": linhas, **metricas}]
+            resultados += medir_etapas(engine, linhas, args.memoria)
+            if args.sessoes > 0:
+                resultados.append(medir_concorrencia(engine, linhas, args.sessoes, args.repeticoes))
+
+            for resultado in resultados:
+                saida.write(json.dumps({**execucao, **resultado}) + "\n")
+            saida.flush()
+    finally:
+        if saida is not sys.stdout:
+            saida.close()
+        metadata.drop_all(engine)
+
+
+if __name__ == "__main__":
+    main()
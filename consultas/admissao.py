@@ -0,0 +1,165 @@
+# --------------------------------------
+# Controle de admissão das consultas no Protheus
+# --------------------------------------
+# - Limita quantas consultas rodam ao mesmo tempo, no total e por usuário
+# - Quem passa do limite espera numa fila atendida em rodízio entre os
+#   usuários, para que um usuário não ocupe todas as vagas
+# - Recusa novas consultas quando a fila está cheia
+# - Consultas idênticas em andamento compartilham uma única execução
+# --------------------------------------
+
+import itertools
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+
+class ConsultaRecusada(Exception):
+    pass
+
+
+# Sinaliza para quem compartilha a execução que o dono foi interrompido
+# (Stop/rerun do Streamlit) sem resultado nem erro da consulta
+class _ExecucaoAbandonada(Exception):
+    pass
+
+
+class ControleAdmissao:
+    def __init__(self, limite_global=4, limite_usuario=1, tamanho_fila=20, intervalo_aviso=1.0):
+        self.limite_global = limite_global
+        self.limite_usuario = limite_usuario
+        self.tamanho_fila = tamanho_fila
+        self.intervalo_aviso = intervalo_aviso
+
+        self._condicao = threading.Condition()
+        self._senhas = itertools.count()
+        self._filas = OrderedDict()  # usuário -> senhas aguardando, na ordem do rodízio
+        self._rodando = {}  # usuário -> consultas em execução
+        self._total_rodando = 0
+        self._em_andamento = {}  # chave da consulta -> Future compartilhado
+
+    # Executa a função respeitando os limites; ao_aguardar recebe a posição na fila
+    def executar(self, usuario, chave, funcao, ao_aguardar=None):
+        while True:
+            with self._condicao:
+                futuro = self._em_andamento.get(chave)
+                dono = futuro is None
+                if dono:
+                    futuro = Future()
+                    self._em_andamento[chave] = futuro
+
+            if dono:
+                return self._executar_como_dono(usuario, chave, funcao, ao_aguardar, futuro)
+
+            try:
+                return futuro.result()
+            except _ExecucaoAbandonada:
+                # O dono foi interrompido: tenta de novo, possivelmente assumindo a execução
+                continue
+
+    def _executar_como_dono(self, usuario, chave, funcao, ao_aguardar, futuro):
+        try:
+            self._entrar(usuario, ao_aguardar)
+            try:
+                resultado = funcao()
+            finally:
+                self._sair(usuario)
+        except Exception as erro:
+            self._encerrar(chave)
+            futuro.set_exception(erro)
+            raise
+        except BaseException:
+            # StopException/RerunException são da sessão do dono e não devem
+            # interromper as outras sessões que aguardam o mesmo resultado
+            self._encerrar(chave)
+            futuro.set_exception(_ExecucaoAbandonada())
+            raise
+
+        self._encerrar(chave)
+        futuro.set_result(resultado)
+        return resultado
+
+    # Remove a execução antes de liberar quem aguarda, para que uma nova tentativa não a encontre
+    def _encerrar(self, chave):
+        with self._condicao:
+            del self._em_andamento[chave]
+
+    # Situação atual, para exibir na interface
+    def situacao(self):
+        with self._condicao:
+            return {
+                "rodando": self._total_rodando,
+                "aguardando": sum(len(fila) for fila in self._filas.values()),
+            }
+
+    # Aguarda a vez da senha na fila
+    def _entrar(self, usuario, ao_aguardar):
+        with self._condicao:
+            aguardando = sum(len(fila) for fila in self._filas.values())
+            sem_vaga = (self._total_rodando >= self.limite_global
+                        or self._rodando.get(usuario, 0) >= self.limite_usuario)
+            if sem_vaga and aguardando >= self.tamanho_fila:
+                raise ConsultaRecusada(
+                    f"Sistema ocupado: {self._total_rodando} consultas em execução e {aguardando} na fila."
+                )
+
+            senha = next(self._senhas)
+            self._filas.setdefault(usuario, deque()).append(senha)
+            try:
+                while self._proxima() != senha:
+                    if ao_aguardar:
+                        # O aviso (que escreve na página) roda sem a trava, para
+                        # não segurar a fila de todos enquanto a sessão é atualizada
+                        posicao = self._posicao(usuario, senha)
+                        self._condicao.release()
+                        try:
+                            ao_aguardar(posicao)
+                        finally:
+                            self._condicao.acquire()
+                    self._condicao.wait(self.intervalo_aviso)
+            except BaseException:
+                self._remover(usuario, senha)
+                self._condicao.notify_all()
+                raise
+
+            self._remover(usuario, senha)
+            # Usuário atendido vai para o fim do rodízio
+            if usuario in self._filas:
+                self._filas.move_to_end(usuario)
+            self._rodando[usuario] = self._rodando.get(usuario, 0) + 1
+            self._total_rodando += 1
+            # Pode haver vaga para a próxima senha de outro usuário
+            self._condicao.notify_all()
+
+    def _sair(self, usuario):
+        with self._condicao:
+            self._rodando[usuario] -= 1
+            if not self._rodando[usuario]:
+                del self._rodando[usuario]
+            self._total_rodando -= 1
+            self._condicao.notify_all()
+
+    # Próxima senha a ser atendida: a primeira do primeiro usuário do rodízio que ainda tem vaga
+    def _proxima(self):
+        if self._total_rodando >= self.limite_global:
+            return None
+        for usuario, fila in self._filas.items():
+            if self._rodando.get(usuario, 0) < self.limite_usuario:
+                return fila[0]
+        return None
+
+    # Posição estimada considerando que o rodízio atende uma senha de cada usuário por vez
+    def _posicao(self, usuario, senha):
+        fila = self._filas[usuario]
+        ordem = fila.index(senha)
+        outras = sum(min(len(f), ordem + 1) for u, f in self._filas.items() if u != usuario)
+        return ordem + outras + 1
+
+    def _remover(self, usuario, senha):
+        fila = self._filas.get(usuario)
+        if fila is None:
+            return
+        if senha in fila:
+            fila.remove(senha)
+        if not fila:
+            del self._filas[usuario]
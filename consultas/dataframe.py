@@ -0,0 +1,93 @@
+# --------------------------------------
+# Construção de DataFrames a partir do cursor
+# --------------------------------------
+# - Lê o resultado em lotes direto para colunas Arrow, sem passar por
+#   uma lista de tuplas com todas as linhas
+# - Remove o preenchimento de espaços dos campos CHAR do Protheus
+# - Converte códigos repetitivos em categorias e reduz os tipos inteiros
+# --------------------------------------
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from sqlalchemy import text
+
+# Quantidade de linhas lidas do cursor por vez
+TAMANHO_LOTE = 10_000
+
+# Proporção máxima de valores distintos para uma coluna virar categoria
+LIMITE_CATEGORIA = 0.5
+
+
+# Executa a consulta e monta o DataFrame lendo o cursor em lotes
+def ler_dataframe(conn, sql, params=None, tamanho_lote=TAMANHO_LOTE):
+    result = conn.execution_options(stream_results=True).execute(text(sql), params or {})
+    colunas = list(result.keys())
+    lotes = [[] for _ in colunas]
+
+    for linhas in result.partitions(tamanho_lote):
+        for i, valores in enumerate(zip(*linhas)):
+            lotes[i].append(_array_arrow(valores))
+
+    if not lotes or not lotes[0]:
+        return pd.DataFrame(columns=colunas)
+
+    tabela = pa.table([_otimizar_coluna(_combinar_lotes(partes)) for partes in lotes], names=colunas)
+    df = tabela.to_pandas(types_mapper=_tipo_pandas)
+    return _reduzir_numericos(df)
+
+
+# Converte os valores de uma coluna do lote em array Arrow
+def _array_arrow(valores):
+    try:
+        return pa.array(valores)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Tipos misturados na mesma coluna: mantém como texto
+        return pa.array([None if v is None else str(v) for v in valores], type=pa.string())
+
+
+# Junta os lotes de uma coluna, unificando os tipos inferidos em cada lote
+def _combinar_lotes(partes):
+    tipos = {p.type for p in partes if p.type != pa.null()}
+    if not tipos:
+        return pa.chunked_array(partes, type=pa.null())
+    if len(tipos) == 1:
+        tipo = tipos.pop()
+        return pa.chunked_array([p.cast(tipo) for p in partes], type=tipo)
+
+    valores = [v for p in partes for v in p.to_pylist()]
+    return pa.chunked_array([_array_arrow(valores)])
+
+
+# Ajusta o tipo Arrow da coluna antes da conversão para pandas
+def _otimizar_coluna(coluna):
+    if pa.types.is_decimal(coluna.type):
+        # Mesmo comportamento do pd.read_sql (coerce_float)
+        return pc.cast(coluna, pa.float64())
+
+    if pa.types.is_string(coluna.type) or pa.types.is_large_string(coluna.type):
+        # Campos CHAR do Protheus vêm preenchidos com espaços à direita
+        coluna = pc.utf8_rtrim_whitespace(coluna)
+        preenchidos = len(coluna) - coluna.null_count
+        if preenchidos and pc.count_distinct(coluna).as_py() <= preenchidos * LIMITE_CATEGORIA:
+            return coluna.dictionary_encode()
+
+    return coluna
+
+
+# Textos ficam em StringDtype com armazenamento Arrow; colunas dicionário viram categoria
+def _tipo_pandas(tipo):
+    if pa.types.is_string(tipo) or pa.types.is_large_string(tipo):
+        return pd.StringDtype("pyarrow")
+    return None
+
+
+# Reduz os inteiros para o menor tipo com sinal que comporta os valores (sem sinal,
+# contas como R_E_C_N_O_ - 1 dariam a volta silenciosamente)
+# (floats ficam em float64 para não perder precisão nos valores monetários)
+def _reduzir_numericos(df):
+    for col in df.columns:
+        serie = df[col]
+        if pd.api.types.is_integer_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+            df[col] = pd.to_numeric(serie, downcast="integer")
+    return df
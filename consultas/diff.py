@@ -0,0 +1,86 @@
+# --------------------------------------
+# Diferença entre execuções e atualização incremental
+# --------------------------------------
+# - Compara o resultado atual com a execução anterior da mesma consulta
+#   usando hash das linhas, separando incluídos, removidos e alterados
+# - Com uma coluna de marca d'água (data, R_E_C_N_O_), busca só as linhas
+#   novas e junta ao resultado guardado
+# --------------------------------------
+
+import hashlib
+
+import pandas as pd
+
+from consultas.dataframe import ler_dataframe
+
+
+# Identifica a execução pela consulta final e pelos valores dos filtros
+def chave_execucao(sql, params):
+    conteudo = sql + repr(sorted((params or {}).items()))
+    return hashlib.sha1(conteudo.encode("utf-8")).hexdigest()
+
+
+# Hash de cada linha considerando apenas as colunas que não são a chave
+def _hash_linhas(df, chave):
+    valores = df.drop(columns=[chave]).astype(str)
+    return pd.Series(pd.util.hash_pandas_object(valores, index=False).values, index=df[chave].astype(str).values)
+
+
+# Compara duas execuções pela coluna chave
+def calcular_diff(df_anterior, df_atual, chave):
+    hash_anterior = _hash_linhas(df_anterior, chave)
+    hash_atual = _hash_linhas(df_atual, chave)
+    hash_anterior = hash_anterior[~hash_anterior.index.duplicated(keep="last")]
+    hash_atual = hash_atual[~hash_atual.index.duplicated(keep="last")]
+
+    incluidas = hash_atual.index.difference(hash_anterior.index)
+    removidas = hash_anterior.index.difference(hash_atual.index)
+    comuns = hash_atual.index.intersection(hash_anterior.index)
+    alteradas = comuns[hash_atual[comuns].values != hash_anterior[comuns].values]
+
+    chave_anterior = df_anterior[chave].astype(str)
+    chave_atual = df_atual[chave].astype(str)
+    return {
+        "incluidos": df_atual[chave_atual.isin(incluidas)],
+        "removidos": df_anterior[chave_anterior.isin(removidas)],
+        "alterados": df_atual[chave_atual.isin(alteradas)],
+    }
+
+
+# Maior valor da marca d'água já carregado, pronto para ser usado como parâmetro
+def _valor_marca(df, coluna):
+    serie = df[coluna].dropna()
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        serie = serie.astype(serie.cat.categories.dtype)
+    if serie.empty:
+        return None
+    valor = serie.max()
+    return valor.item() if hasattr(valor, "item") else valor
+
+
+# Busca apenas as linhas posteriores à marca d'água e junta ao resultado anterior
+def atualizar_incremental(conn, sql, params, df_anterior, coluna_marca, chave=None):
+    marca = _valor_marca(df_anterior, coluna_marca)
+    if marca is None:
+        return ler_dataframe(conn, sql, params)
+
+    # Usa >= para não perder linhas gravadas depois com a mesma marca; as linhas
+    # já carregadas com a marca máxima voltam na busca e são substituídas por ela
+    # (sem chave não há outra forma de saber quais são repetidas)
+    sql_incremental = f"SELECT * FROM ({sql}) AS incremental WHERE {coluna_marca} >= :marca_dagua"
+    novos = ler_dataframe(conn, sql_incremental, {**(params or {}), "marca_dagua": marca})
+    if novos.empty:
+        return df_anterior
+
+    marcas = df_anterior[coluna_marca]
+    if isinstance(marcas.dtype, pd.CategoricalDtype):
+        marcas = marcas.astype(marcas.cat.categories.dtype)
+    df = pd.concat([df_anterior[marcas != marca], novos], ignore_index=True)
+    # Categorias diferentes entre os dois lotes fazem o concat perder a categoria
+    for col in df_anterior.columns:
+        if isinstance(df_anterior[col].dtype, pd.CategoricalDtype) and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+    if chave:
+        chaves = df[chave].astype(str)
+        df = df[~chaves.duplicated(keep="last")].reset_index(drop=True)
+    return df
@@ -0,0 +1,18 @@
+# --------------------------------------
+# Exportação do resultado para download
+# --------------------------------------
+
+from io import BytesIO
+
+
+# Gera o arquivo Excel do resultado
+def gerar_excel(df):
+    excel_stream = BytesIO()
+    df.to_excel(excel_stream, index=False, engine="openpyxl")
+    excel_stream.seek(0)
+    return excel_stream
+
+
+# Gera o arquivo CSV do resultado
+def gerar_csv(df):
+    return df.to_csv(index=False).encode("utf-8")
@@ -0,0 +1,193 @@
+# --------------------------------------
+# Roteamento das leituras do Protheus entre réplicas
+# --------------------------------------
+# - As consultas vão para réplicas somente leitura, tirando a carga de
+#   relatórios do banco principal do ERP
+# - As réplicas são verificadas ao criar o roteador e depois periodicamente
+#   por uma thread; as fora do ar ou com atraso de replicação acima do limite
+#   ficam de fora até a próxima verificação
+# - Entre as réplicas disponíveis, escolhe a com menos consultas em
+#   andamento; sem nenhuma disponível, usa o banco principal
+# --------------------------------------
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine.url import URL
+
+# Situação da réplica: se está em recuperação, se o processo WAL receiver está ativo
+# e o status dele, se aplicou tudo o que recebeu e o tempo desde a última transação aplicada.
+# Sem pg_monitor (ou pg_read_all_stats) o PostgreSQL só mostra o pid do WAL receiver
+# e o status vem NULL
+SQL_SITUACAO_REPLICA = """
+    SELECT pg_is_in_recovery(),
+           EXISTS (SELECT 1 FROM pg_stat_wal_receiver),
+           (SELECT status FROM pg_stat_wal_receiver),
+           pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn(),
+           EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+"""
+
+
+class _Replica:
+    def __init__(self, engine):
+        self.engine = engine
+        # Fica fora até a primeira verificação
+        self.disponivel = False
+        self.atraso = 0.0
+        self.em_andamento = 0
+
+
+class RoteadorReplicas:
+    def __init__(self, primaria, replicas=(), atraso_maximo=30, intervalo_verificacao=15):
+        self.primaria = primaria
+        self.atraso_maximo = atraso_maximo
+        self.intervalo_verificacao = intervalo_verificacao
+        self._replicas = [_Replica(engine) for engine in replicas]
+        self._trava = threading.Lock()
+        self._avisou_sem_permissao = False
+
+        # As verificações rodam fora do caminho das consultas, para que uma réplica
+        # fora do ar (connect_timeout) não atrase a consulta de ninguém
+        if self._replicas:
+            threading.Thread(target=self._verificar_periodicamente, name="verificacao-replicas", daemon=True).start()
+
+    # Mesma interface do Engine: with roteador.connect() as conn
+    @contextmanager
+    def connect(self):
+        replica = self._escolher()
+        if replica is None:
+            with self.primaria.connect() as conn:
+                yield conn
+            return
+
+        try:
+            conn = replica.engine.connect()
+        except Exception as e:
+            logging.warning("Réplica %s indisponível, usando o banco principal: %s", replica.engine.url.host, e)
+            self._liberar(replica, disponivel=False)
+            with self.primaria.connect() as conn:
+                yield conn
+            return
+
+        try:
+            with conn:
+                yield conn
+        finally:
+            self._liberar(replica)
+
+    # Situação das réplicas, para exibir na interface
+    def situacao(self):
+        with self._trava:
+            return [
+                {
+                    "host": replica.engine.url.host,
+                    "disponivel": replica.disponivel,
+                    "atraso": replica.atraso,
+                    "em_andamento": replica.em_andamento,
+                }
+                for replica in self._replicas
+            ]
+
+    # Réplica saudável com menos consultas em andamento (None = banco principal)
+    def _escolher(self):
+        with self._trava:
+            candidatas = [
+                replica for replica in self._replicas
+                if replica.disponivel and replica.atraso <= self.atraso_maximo
+            ]
+            if not candidatas:
+                return None
+            replica = min(candidatas, key=lambda r: r.em_andamento)
+            replica.em_andamento += 1
+            return replica
+
+    def _liberar(self, replica, disponivel=True):
+        with self._trava:
+            replica.em_andamento -= 1
+            if not disponivel:
+                replica.disponivel = False
+
+    # Verifica todas as réplicas agora, sem esperar a próxima rodada da thread
+    def verificar_agora(self):
+        for replica in self._replicas:
+            self._verificar(replica)
+
+    def _verificar_periodicamente(self):
+        while True:
+            time.sleep(self.intervalo_verificacao)
+            self.verificar_agora()
+
+    # Verifica se a réplica responde e qual o atraso de replicação
+    def _verificar(self, replica):
+        try:
+            with replica.engine.connect() as conn:
+                em_recuperacao, receiver_ativo, status, em_dia, atraso = conn.execute(text(SQL_SITUACAO_REPLICA)).one()
+        except Exception as e:
+            logging.warning("Falha ao verificar a réplica %s: %s", replica.engine.url.host, e)
+            em_recuperacao, receiver_ativo, status, em_dia, atraso = False, False, None, False, None
+
+        if receiver_ativo and status is None and not self._avisou_sem_permissao:
+            self._avisou_sem_permissao = True
+            logging.warning(
+                "Sem permissão para ler o status do WAL receiver na réplica %s: conceda pg_monitor "
+                "ao usuário para detectar um receiver parado; até lá basta o processo estar ativo",
+                replica.engine.url.host
+            )
+        # Sem permissão, o processo ativo é o único sinal de que o receiver está recebendo
+        recebendo = receiver_ativo and status in ("streaming", None)
+
+        if not em_recuperacao:
+            disponivel, atraso = False, 0.0
+        elif recebendo and em_dia:
+            disponivel, atraso = True, 0.0
+        elif atraso is None:
+            # Nenhuma transação aplicada ainda: não há como medir o atraso
+            disponivel, atraso = False, 0.0
+        else:
+            # Sem o WAL receiver ativo, "tudo aplicado" não quer dizer em dia:
+            # o atraso é o tempo desde a última transação aplicada
+            disponivel, atraso = True, float(atraso)
+
+        with self._trava:
+            replica.disponivel = disponivel
+            replica.atraso = atraso
+
+
+# Conexão com um servidor do Protheus (principal ou réplica)
+def criar_engine_protheus(host=None, port=None, **query):
+    return create_engine(
+        URL.create(
+            drivername="postgresql+psycopg2",
+            username=os.getenv("username_protheus"),
+            password=os.getenv("password"),
+            host=host or os.getenv("host"),
+            port=port or os.getenv("port"),
+            database=os.getenv("database"),
+            query={"sslmode": "disable", **query}
+        )
+    )
+
+
+# Banco principal mais as réplicas de replicas_protheus ("host:porta,host:porta")
+def criar_roteador_protheus():
+    replicas = []
+    for endereco in os.getenv("replicas_protheus", "").split(","):
+        if endereco.strip():
+            host, _, port = endereco.strip().partition(":")
+            # Timeout curto para uma réplica fora do ar não travar a consulta
+            replicas.append(criar_engine_protheus(host, port or None, connect_timeout="5"))
+
+    roteador = RoteadorReplicas(
+        criar_engine_protheus(),
+        replicas,
+        atraso_maximo=float(os.getenv("atraso_maximo_replica", 30)),
+        intervalo_verificacao=float(os.getenv("intervalo_verificacao_replica", 15))
+    )
+    # Primeira verificação antes do primeiro uso; sem ela as réplicas começam
+    # fora e as primeiras consultas iriam todas para o banco principal
+    roteador.verificar_agora()
+    return roteador